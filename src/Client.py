@@ -1,13 +1,16 @@
 import signal
 import time
 import socket
+import threading
+import queue
 import tqdm
 import os
 import argparse
 from sys import exit
 from ipaddress import ip_address
 
-from Enums import MessageType, Response
+from Enums import MessageType, Response, TracePhase
+from Tracing import Tracer, now
 
 CLIENT_CLOSE = False
 
@@ -58,22 +61,49 @@ def connect_to_server(server_IP, server_PORT):
     return client_socket
 
 
-def send_message(client_socket, message_type, data):
+def connect_to_unix_server(unix_socket_path):
+    """
+    Подключается к серверу через Unix domain сокет (сервер на той же машине).
+    Args:
+        unix_socket_path: str, путь к сокету сервера
+
+    raise:
+        ConnectionError
+    """
+    client_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    client_socket.settimeout(3)
+    try:
+        client_socket.connect(unix_socket_path)
+    except (OSError, socket.timeout):
+        client_socket.close()
+        raise ConnectionError("Connection failed")
+
+    return client_socket
+
+
+def send_message(client_socket, message_type, data, tracer=None):
     """
     Отправляет сообщение на сервер.
     Args:
         client_socket: socket, сокет клиента
         message_type: MessageType, тип сообщения
         data: bytes, данные
+        tracer: Tracer, трассировщик (None - трассировка выключена)
 
     raise:
         ConnectionError
     """
     try:
+        start_ns = now() if tracer is not None else 0
         client_socket.send(message_type.value)
         client_socket.send(len(data).to_bytes(8))
         client_socket.send(data)
+        if tracer is not None:
+            tracer.record(TracePhase.CLIENT_SEND, start_ns, size=len(data) + 14)
+            start_ns = now()
         response = client_socket.recv(1)
+        if tracer is not None:
+            tracer.record(TracePhase.CLIENT_ACK, start_ns, size=len(response))
         if response == Response.FILE_IS_BEING_ALREADY_TRANSFERRED.value:
             raise ConnectionError("File is being already transferred")
         if response != Response.SUCCESS.value:
@@ -84,6 +114,223 @@ def send_message(client_socket, message_type, data):
         raise e
 
 
+def recv_exact(client_socket, size):
+    """
+    Принимает ровно size байт.
+    Args:
+        client_socket: socket, сокет клиента
+        size: int, количество байт
+
+    raise:
+        ConnectionError
+    """
+    data = bytearray()
+    while len(data) < size:
+        chunk = client_socket.recv(size - len(data))
+        if not chunk:
+            raise ConnectionError("Connection closed by server")
+        data += chunk
+    return bytes(data)
+
+
+def send_request(client_socket, message_type, data):
+    """
+    Отправляет запрос на сервер и принимает заголовок ответа.
+    Args:
+        client_socket: socket, сокет клиента
+        message_type: MessageType, тип сообщения
+        data: bytes, данные
+
+    Returns:
+        response_len: int, длина тела ответа
+
+    raise:
+        ConnectionError
+    """
+    client_socket.send(message_type.value)
+    client_socket.send(len(data).to_bytes(8))
+    client_socket.send(data)
+    response = client_socket.recv(1)
+    if response == Response.FILE_NOT_FOUND.value:
+        raise ConnectionError("File not found")
+    if response != Response.SUCCESS.value:
+        if response == Response.ERROR.value:
+            raise ConnectionError("Request failed")
+        raise ConnectionError("Connection failed")
+    return int.from_bytes(recv_exact(client_socket, 8))
+
+
+def request_file_list(client_socket):
+    """
+    Запрашивает список файлов на сервере.
+    Args:
+        client_socket: socket, сокет клиента
+
+    Returns:
+        files: dict, словарь: имя файла -> размер файла
+    """
+    listing = recv_exact(client_socket, send_request(client_socket, MessageType.LIST, b'\x00'))
+    files = {}
+    # Разделитель записей - только "\n": splitlines() разрезал бы имена с "\r", "\x0b" и т.п.
+    for line in listing.decode(errors="replace").split("\n"):
+        if not line:
+            continue
+        file_name, _, file_size = line.rpartition('\t')
+        if not file_name or not file_size.isdigit():
+            # Пропускаем некорректные записи вместо аварийного завершения
+            continue
+        files[file_name] = int(file_size)
+    return files
+
+
+def receive_file(file_path, client_socket, file_name, offset=0, length=0, BUFFER_SIZE=1024):
+    """
+    Генератор, принимающий файл (или диапазон байт файла) с сервера.
+    Args:
+        file_path: str, путь к существующему локальному файлу, в который записываются данные
+        client_socket: socket, сокет клиента
+        file_name: str, имя файла на сервере
+        offset: int, смещение начала диапазона
+        length: int, длина диапазона (0 - до конца файла)
+        BUFFER_SIZE: int, размер буфера
+
+    Yield:
+        len(data): int, количество принятых байт
+    """
+    request = f"{file_name}\t{offset}\t{length}".encode()
+    remaining = send_request(client_socket, MessageType.GET, request)
+
+    buffer = bytearray(BUFFER_SIZE)
+    view = memoryview(buffer)
+    with open(file_path, "r+b") as file:
+        file.seek(offset)
+        while remaining > 0:
+            data_len = client_socket.recv_into(view, min(BUFFER_SIZE, remaining))
+            if data_len == 0:
+                raise ConnectionError("Connection closed by server")
+            file.write(view[:data_len])
+            remaining -= data_len
+            yield data_len
+
+
+def download_file(file_path, server_IP, server_PORT, file_name, file_size, connections=1, BUFFER_SIZE=1024):
+    """
+    Генератор, скачивающий файл с сервера параллельно по нескольким соединениям (по диапазонам байт).
+    Данные принимаются во временный файл "<file_path>.part", который переименовывается только после
+    приема всех диапазонов и удаляется при ошибке.
+    Args:
+        file_path: str, путь к локальному файлу
+        server_IP: str, IP-адрес сервера
+        server_PORT: int, порт сервера
+        file_name: str, имя файла на сервере
+        file_size: int, размер файла
+        connections: int, количество параллельных соединений
+        BUFFER_SIZE: int, размер буфера
+
+    Yield:
+        len(data): int, количество принятых байт
+
+    raise:
+        ConnectionError
+    """
+    part_path = file_path + ".part"
+    with open(part_path, "wb") as file:
+        file.truncate(file_size)
+    completed = False
+    try:
+        yield from receive_ranges(part_path, server_IP, server_PORT, file_name, file_size, connections, BUFFER_SIZE)
+        os.replace(part_path, file_path)
+        completed = True
+    finally:
+        if not completed and os.path.exists(part_path):
+            os.remove(part_path)
+
+
+def receive_ranges(file_path, server_IP, server_PORT, file_name, file_size, connections=1, BUFFER_SIZE=1024):
+    """
+    Генератор, принимающий файл по диапазонам байт в параллельных потоках.
+    Args:
+        file_path: str, путь к существующему локальному файлу
+        server_IP: str, IP-адрес сервера
+        server_PORT: int, порт сервера
+        file_name: str, имя файла на сервере
+        file_size: int, размер файла
+        connections: int, количество параллельных соединений
+        BUFFER_SIZE: int, размер буфера
+
+    Yield:
+        len(data): int, количество принятых байт
+
+    raise:
+        ConnectionError
+    """
+    if file_size == 0:
+        return
+
+    connections = max(1, min(connections, file_size))
+    part_size = -(-file_size // connections)
+    ranges = [(offset, min(part_size, file_size - offset)) for offset in range(0, file_size, part_size)]
+    progress = queue.Queue()
+
+    def receive_range(offset, length):
+        try:
+            client_socket = connect_to_server(server_IP, server_PORT)
+            try:
+                for data_len in receive_file(file_path, client_socket, file_name, offset, length, BUFFER_SIZE):
+                    progress.put(data_len)
+            finally:
+                client_socket.close()
+            progress.put(None)
+        except (ConnectionError, OSError) as e:
+            progress.put(ConnectionError(str(e)))
+
+    threads = [threading.Thread(target=receive_range, args=part, daemon=True) for part in ranges]
+    for thread in threads:
+        thread.start()
+
+    finished = 0
+    while finished < len(threads):
+        item = progress.get()
+        if item is None:
+            finished += 1
+        elif isinstance(item, ConnectionError):
+            raise item
+        else:
+            yield item
+
+
+def send_file_descriptor(client_socket, file):
+    """
+    Передает серверу открытый файловый дескриптор (SCM_RIGHTS), чтобы сервер сам скопировал файл.
+    Args:
+        client_socket: socket, сокет клиента (Unix domain)
+        file: file, открытый файл
+
+    Returns:
+        bool, True - сервер скопировал файл, False - нужно передавать файл сообщениями DATA
+
+    raise:
+        ConnectionError
+    """
+    client_socket.send(MessageType.FD.value)
+    client_socket.send((1).to_bytes(8))
+    try:
+        socket.send_fds(client_socket, [b'\x00'], [file.fileno()])
+    except ConnectionError as e:
+        raise e
+    except OSError:
+        # Дескриптор не удалось прикрепить: отправляем сообщение без него, сервер ответит отказом
+        client_socket.send(b'\x00')
+    response = client_socket.recv(1)
+    if response == Response.FD_NOT_ACCEPTED.value:
+        return False
+    if response != Response.SUCCESS.value:
+        if response == Response.ERROR.value:
+            raise ConnectionError("Transfer failed")
+        raise ConnectionError("Connection failed")
+    return True
+
+
 def send_file_params(client_socket, file_path):
     """
     Отправляет параметры файла на сервер.
@@ -100,13 +347,14 @@ def send_file_params(client_socket, file_path):
     send_message(client_socket, MessageType.START, title)
 
 
-def send_file(file_path, client_socket, BUFFER_SIZE=1024):
+def send_file(file_path, client_socket, BUFFER_SIZE=1024, tracer=None):
     """
     Генератор, отправляющий файл на сервер.
     Args:
         file_path: str, путь к файлу
         client_socket: socket, сокет клиента
         BUFFER_SIZE: int, размер буфера
+        tracer: Tracer, трассировщик (None - трассировка выключена)
 
     Returns:
 
@@ -121,15 +369,26 @@ def send_file(file_path, client_socket, BUFFER_SIZE=1024):
     send_file_params(client_socket, file_path)
 
     with open(file_path, "rb") as file:
+        # Сервер на той же машине копирует файл сам по переданному дескриптору
+        if client_socket.family == socket.AF_UNIX and send_file_descriptor(client_socket, file):
+            yield file_size
+            send_message(client_socket, MessageType.END, b'\x00')
+            return
+
         while True:
+            chunk_start_ns = start_ns = now() if tracer is not None else 0
             data = file.read(BUFFER_SIZE)
+            if tracer is not None:
+                tracer.record(TracePhase.CLIENT_READ, start_ns, size=len(data))
             while True:
                 # time.sleep(0.005)
                 try:
-                    send_message(client_socket, MessageType.DATA, data)
+                    send_message(client_socket, MessageType.DATA, data, tracer)
                     break
                 except ConnectionError as e:
                     raise e
+            if tracer is not None:
+                tracer.record(TracePhase.CLIENT_CHUNK, chunk_start_ns, size=len(data))
             file_size -= len(data)
             yield len(data)
             if file_size == 0:
@@ -137,7 +396,7 @@ def send_file(file_path, client_socket, BUFFER_SIZE=1024):
                 break
 
 
-def main(file_path, server_IP, server_PORT, BUFFER_SIZE=1024):
+def main(file_path, server_IP, server_PORT, BUFFER_SIZE=1024, unix_socket_path=None, trace_path=None):
     """
     Основная функция
     Args:
@@ -145,18 +404,28 @@ def main(file_path, server_IP, server_PORT, BUFFER_SIZE=1024):
         server_IP: str, IP-адрес сервера
         server_PORT: int, порт сервера
         BUFFER_SIZE: int, размер буфера
+        unix_socket_path: str, путь к Unix domain сокету сервера (None - не использовать)
+        trace_path: str, файл для сохранения трассировки (None - трассировка выключена)
     """
     if os.path.exists(file_path) is False:
         print(f"File {file_path} not found. Exiting...")
         exit(1)
     file_name = os.path.basename(file_path)
     file_size = os.path.getsize(file_path)
-    try:
-        client_socket = connect_to_server(server_IP, server_PORT)
-    except ConnectionError as e:
-        print(e)
-        exit(1)
-    print(f"Connected to {server_IP}:{server_PORT}")
+    client_socket = None
+    if unix_socket_path is not None:
+        try:
+            client_socket = connect_to_unix_server(unix_socket_path)
+            print(f"Connected to {unix_socket_path}")
+        except ConnectionError:
+            print(f"Unix socket {unix_socket_path} is unavailable, falling back to TCP")
+    if client_socket is None:
+        try:
+            client_socket = connect_to_server(server_IP, server_PORT)
+        except ConnectionError as e:
+            print(e)
+            exit(1)
+        print(f"Connected to {server_IP}:{server_PORT}")
 
     print(f"Sending {file_name} ({file_size} bytes)")
     progress_bar = tqdm.tqdm(range(file_size),
@@ -180,9 +449,11 @@ def main(file_path, server_IP, server_PORT, BUFFER_SIZE=1024):
     signal.signal(signal.SIGINT, exit_gracefully)
     signal.signal(signal.SIGTERM, exit_gracefully)
 
+    tracer = Tracer() if trace_path is not None else None
+
     # Отправка файла
     try:
-        for data_len in send_file(file_path, client_socket, BUFFER_SIZE):
+        for data_len in send_file(file_path, client_socket, BUFFER_SIZE, tracer):
             progress_bar.update(data_len)
         progress_bar.close()
     except ConnectionError as e:
@@ -191,25 +462,114 @@ def main(file_path, server_IP, server_PORT, BUFFER_SIZE=1024):
         exit(1)
     finally:
         client_socket.close()
+        if tracer is not None:
+            try:
+                tracer.dump(trace_path)
+                print(f"Trace saved to {trace_path}")
+            except OSError as e:
+                print(f"Error: {e}")
 
     print(f"File {os.path.basename(file_path)} sent successfully")
 
 
+def main_list(server_IP, server_PORT):
+    """
+    Выводит список файлов на сервере.
+    Args:
+        server_IP: str, IP-адрес сервера
+        server_PORT: int, порт сервера
+    """
+    try:
+        client_socket = connect_to_server(server_IP, server_PORT)
+        try:
+            files = request_file_list(client_socket)
+        finally:
+            client_socket.close()
+    except ConnectionError as e:
+        print(e)
+        exit(1)
+
+    for file_name, file_size in files.items():
+        print(f"{file_name}\t{file_size}")
+
+
+def main_download(file_name, server_IP, server_PORT, BUFFER_SIZE=1024, connections=1):
+    """
+    Скачивает файл с сервера в текущий каталог.
+    Args:
+        file_name: str, имя файла на сервере
+        server_IP: str, IP-адрес сервера
+        server_PORT: int, порт сервера
+        BUFFER_SIZE: int, размер буфера
+        connections: int, количество параллельных соединений
+    """
+    file_path = os.path.basename(file_name)
+    try:
+        client_socket = connect_to_server(server_IP, server_PORT)
+        try:
+            files = request_file_list(client_socket)
+        finally:
+            client_socket.close()
+    except ConnectionError as e:
+        print(e)
+        exit(1)
+    if file_path not in files:
+        print(f"File {file_path} not found on server. Exiting...")
+        exit(1)
+    file_size = files[file_path]
+
+    print(f"Receiving {file_path} ({file_size} bytes)")
+    progress_bar = tqdm.tqdm(range(file_size),
+                             f"Receiving {file_path}",
+                             unit="B",
+                             unit_scale=True,
+                             unit_divisor=1024,
+                             colour="green"
+                             )
+    try:
+        for data_len in download_file(file_path, server_IP, server_PORT, file_path, file_size,
+                                      connections, BUFFER_SIZE):
+            progress_bar.update(data_len)
+        progress_bar.close()
+    except (ConnectionError, OSError) as e:
+        progress_bar.close()
+        print(e)
+        exit(1)
+
+    print(f"File {file_path} received successfully")
+
+
 if __name__ == "__main__":
     # Парсинг аргументов командной строки
     parser = argparse.ArgumentParser()
-    parser.add_argument("-file_name", required=True)
+    parser.add_argument("-file_name")
     parser.add_argument("-server_IP", required=True)
     parser.add_argument("-server_PORT", type=int, required=True)
     parser.add_argument("--buffer_size", type=int, default=1024)
+    parser.add_argument("--list", action="store_true", help="List files stored on the server")
+    parser.add_argument("--get", action="store_true", help="Download -file_name from the server")
+    parser.add_argument("--connections", type=int, default=1,
+                        help="Number of parallel connections for --get (default: 1)")
+    parser.add_argument("--unix_socket", default=None,
+                        help="Server Unix domain socket for same-host transfers (falls back to TCP)")
+    parser.add_argument("--trace", default=None, help="Record hot-path trace of the upload to this file")
     args = parser.parse_args()
+    if not args.list and args.file_name is None:
+        parser.error("the following arguments are required: -file_name")
 
     # Запуск основной функции
     try:
         validate_ip_port(args.server_IP, args.server_PORT)
         if args.buffer_size <= 0 or args.buffer_size > 32768:
             raise ValueError("Buffer size must be between 1 and 32768")
+        if args.connections <= 0 or args.connections > 64:
+            raise ValueError("Number of connections must be between 1 and 64")
     except ValueError as e:
         print(e)
         exit(1)
-    main(args.file_name, args.server_IP, args.server_PORT, args.buffer_size)
+    if args.list:
+        main_list(args.server_IP, args.server_PORT)
+    elif args.get:
+        main_download(args.file_name, args.server_IP, args.server_PORT, args.buffer_size, args.connections)
+    else:
+        main(args.file_name, args.server_IP, args.server_PORT, args.buffer_size, args.unix_socket, args.trace)
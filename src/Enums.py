@@ -9,6 +9,9 @@ class MessageType(Enum):
     END = b'END\x00\x00\x00'
     DATA = b'DATA\x00\x00'
     CANCEL = b'CANCEL'
+    LIST = b'LIST\x00\x00'
+    GET = b'GET\x00\x00\x00'
+    FD = b'FD\x00\x00\x00\x00'
 
 
 class Result(Enum):
@@ -26,4 +29,25 @@ class Response(Enum):
     """
     SUCCESS = b'\x00'
     FILE_IS_BEING_ALREADY_TRANSFERRED = b'\x11'
+    FILE_NOT_FOUND = b'\x12'
+    FD_NOT_ACCEPTED = b'\x13'
     ERROR = b'\xff'
+
+
+class TracePhase(Enum):
+    """
+    Фазы горячего пути, записываемые при трассировке
+    """
+    SERVER_STEP = 1       # Один вызов hear_client_socket: один шаг приема (тип, длина или данные сообщения)
+    SERVER_RECV = 2       # recv типа, длины или данных сообщения
+    SERVER_WRITE = 3      # file.write в handle_data_message
+    SERVER_ACK = 4        # send ответа в handle_data_message
+    SERVER_COPY = 5       # Копирование порции файла по переданному дескриптору (в write_client_socket)
+    SERVER_SENDFILE = 6   # os.sendfile при отдаче файла
+    SERVER_OPEN = 7       # open принимаемого файла в handle_start_message
+    SERVER_LOG = 8        # Запись в лог-файл
+    SERVER_CLONE = 9      # Клонирование (reflink) файла по переданному дескриптору
+    CLIENT_CHUNK = 16     # Отправка одного блока файла целиком
+    CLIENT_READ = 17      # file.read в send_file
+    CLIENT_SEND = 18      # send сообщения в send_message
+    CLIENT_ACK = 19       # recv ответа сервера в send_message
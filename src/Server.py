@@ -1,17 +1,30 @@
 import signal
 import socket
 import os
+import errno
+import fcntl
+import stat
 import argparse
 import csv
+import time
 from datetime import datetime, timezone
 from sys import exit
 
 import select
 
-from Enums import Response, Result, MessageType
+from Enums import Response, Result, MessageType, TracePhase
+from Tracing import Tracer, now
 
 CLOSE_SERVER = False
 
+# ioctl для клонирования содержимого файла (reflink) на btrfs, XFS и т.п.
+FICLONE = getattr(fcntl, "FICLONE", 0x40049409)
+# Максимальный объем копирования по переданному дескриптору за одну итерацию цикла epoll
+COPY_CHUNK_SIZE = 4 * 1024 * 1024
+# Интервал, в течение которого mtime каталога не считается надежным: несколько изменений
+# в пределах одного такта часов файловой системы дают одинаковый mtime
+MTIME_RACY_WINDOW_NS = 1_000_000_000
+
 
 def create_log_file_if_not_exists(recreate=False):
     """
@@ -75,6 +88,90 @@ def start_server(server_IP, server_PORT):
     return server_socket
 
 
+def remove_unix_socket(unix_socket_path):
+    """
+    Удаляет файл Unix domain сокета, оставшийся от предыдущего запуска.
+    Args:
+        unix_socket_path: str, путь к сокету
+
+    raise:
+        OSError, если по этому пути находится не сокет
+    """
+    try:
+        mode = os.lstat(unix_socket_path).st_mode
+    except FileNotFoundError:
+        return
+    if not stat.S_ISSOCK(mode):
+        raise OSError(errno.EEXIST, f"{unix_socket_path} exists and is not a socket")
+    os.remove(unix_socket_path)
+
+
+def start_unix_server(unix_socket_path):
+    """
+    Запуск сервера на Unix domain сокете (для клиентов на той же машине).
+    Args:
+        unix_socket_path: str, путь к сокету
+
+    Returns:
+        server_socket: socket, сокет сервера
+    """
+    server_socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server_socket.setblocking(False)
+    try:
+        remove_unix_socket(unix_socket_path)
+        server_socket.bind(unix_socket_path)
+        server_socket.listen(5)
+    except OSError as e:
+        server_socket.close()
+        raise e
+
+    return server_socket
+
+
+def clone_file_descriptor(src_fd, dst_fd):
+    """
+    Клонирует содержимое файла (reflink), если файловая система это поддерживает.
+    Args:
+        src_fd: int, файловый дескриптор исходного файла
+        dst_fd: int, файловый дескриптор файла назначения
+
+    Returns:
+        bool, True - файл склонирован
+    """
+    try:
+        fcntl.ioctl(dst_fd, FICLONE, src_fd)
+        return True
+    except OSError:
+        return False
+
+
+def copy_file_chunk(src_fd, dst_fd, offset, count):
+    """
+    Копирует часть файла средствами ядра: os.copy_file_range, иначе os.sendfile.
+    Args:
+        src_fd: int, файловый дескриптор исходного файла
+        dst_fd: int, файловый дескриптор файла назначения
+        offset: int, смещение (одинаковое в обоих файлах)
+        count: int, максимальное количество байт
+
+    Returns:
+        copied: int, количество скопированных байт (0 - конец исходного файла)
+
+    raise:
+        OSError
+    """
+    # Смещения передаются явно, чтобы не сдвигать позицию в файле, общую с клиентом
+    try:
+        return os.copy_file_range(src_fd, dst_fd, count, offset, offset)
+    except OSError as e:
+        if e.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP):
+            raise e
+
+    # os.sendfile пишет в текущую позицию файла назначения
+    os.lseek(dst_fd, offset, os.SEEK_SET)
+    return os.sendfile(dst_fd, src_fd, offset, count)
+
+
 def update_log_file(file_name, result):
     """
     Обновляет лог-файл.
@@ -87,6 +184,29 @@ def update_log_file(file_name, result):
         writer.writerow([file_name, str(datetime.now(tz=timezone.utc)).split('.')[0], result])
 
 
+def scan_directory(exclude=()):
+    """
+    Сканирует рабочий каталог сервера.
+    Args:
+        exclude: iterable, имена файлов, которые не попадают в индекс
+
+    Returns:
+        names: set, имена файлов
+    """
+    names = set()
+    with os.scandir(".") as entries:
+        for entry in entries:
+            # Имена с переводом строки не представимы в ответе на LIST (формат "имя\tразмер\n")
+            if entry.name == "log_file.csv" or entry.name in exclude or "\n" in entry.name:
+                continue
+            try:
+                if entry.is_file():
+                    names.add(entry.name)
+            except OSError:
+                pass
+    return names
+
+
 def connect_client(server_socket):
     """
     Подключение клиента.
@@ -106,36 +226,57 @@ def connect_client(server_socket):
     return client_socket, client_address
 
 
-def main(directory="data", server_IP="127.0.0.1", server_PORT=12345):
+def main(directory="data", server_IP="127.0.0.1", server_PORT=12345, unix_socket_path=None, trace_path=None):
     """
     Основная функция
     Args:
         directory: str, каталог
         server_IP: str, IP-адрес сервера
         server_PORT: int, порт сервера
+        unix_socket_path: str, путь к Unix domain сокету (None - не использовать)
+        trace_path: str, файл для сохранения трассировки (None - трассировка выключена)
     """
+    if unix_socket_path is not None:
+        unix_socket_path = os.path.abspath(unix_socket_path)
+    if trace_path is not None:
+        trace_path = os.path.abspath(trace_path)
     try:
         go_to_dir(directory)
         create_log_file_if_not_exists()
         server_socket = start_server(server_IP, server_PORT)
+        listen_sockets = [server_socket]
+        if unix_socket_path is not None:
+            listen_sockets.append(start_unix_server(unix_socket_path))
     except OSError as e:
         print(f"Error: {e}")
         exit(1)
 
     print(f"Server listening on {server_IP}:{server_PORT}")
+    if unix_socket_path is not None:
+        print(f"Server listening on {unix_socket_path}")
     print(f"Working directory: {os.getcwd()}")
 
     epoll = select.epoll()
-    epoll.register(server_socket, select.EPOLLIN)
-
-    fd_to_socket = {server_socket.fileno(): server_socket}  # Словарь: файловый дескриптор -> сокет клиента
+    fd_to_socket = {}  # Словарь: файловый дескриптор -> сокет клиента
+    for listen_socket in listen_sockets:
+        epoll.register(listen_socket, select.EPOLLIN)
+        fd_to_socket[listen_socket.fileno()] = listen_socket
     clients_dict = {}  # Словарь: сокет клиента -> информация о клиенте и ожидаемом от него сообщении
     file_names = []  # Список имен файлов, которые передаются в данный момент
+    # Кэш имен файлов каталога: перечитывается только при изменении каталога или после приема файла
+    dir_index = {"mtime": None, "dirty": True, "names": set()}
+    tracer = Tracer() if trace_path is not None else None  # При выключенной трассировке - одна проверка на None
 
-    def create_client_socket():
-        sock, address = connect_client(server_socket)
+    def create_client_socket(listen_socket):
+        sock, address = connect_client(listen_socket)
         sock.setblocking(False)
-        clients_dict[sock] = dict().fromkeys(["data_len", "message_type", "file"])
+        if sock.family == socket.AF_UNIX:
+            # У клиентов Unix domain сокета нет IP-адреса и порта
+            address = ("unix", sock.fileno())
+        clients_dict[sock] = dict().fromkeys(["address", "data_len", "message_type", "file", "file_size",
+                                              "out_buffer", "send_file", "send_offset", "send_remaining",
+                                              "copy_fd", "copy_offset"])
+        clients_dict[sock]["address"] = address
         fd_to_socket[sock.fileno()] = sock
         epoll.register(sock, select.EPOLLIN)
         print(f"Connection from {address[0]}:{address[1]}")
@@ -155,15 +296,24 @@ def main(directory="data", server_IP="127.0.0.1", server_PORT=12345):
             clients_dict[sock]["file"].close()
             if delete_file:
                 os.remove(clients_dict[sock]["file"].name)
+            dir_index["dirty"] = True
+        if clients_dict[sock]["send_file"] is not None:
+            clients_dict[sock]["send_file"].close()
+        if clients_dict[sock]["copy_fd"] is not None:
+            os.close(clients_dict[sock]["copy_fd"])
         del clients_dict[sock]
         sock.close()
 
     def handle_start_message(sock, data):
-        IP, PORT = sock.getpeername()
+        IP, PORT = clients_dict[sock]["address"]
 
         file_name = data.decode().split('\t')[0]
         file_size = int(data.decode().split('\t')[1])
 
+        if "\n" in file_name:
+            sock.send(Response.ERROR.value)
+            raise ConnectionError(f"Client {IP}:{PORT} disconnected because file name contains a line break")
+
         # Если файл с таким именем в данный момент принимается от другого клиента,
         # то отклоняем принятие ещё одного файла с таким названием
         if file_name in file_names:
@@ -172,33 +322,182 @@ def main(directory="data", server_IP="127.0.0.1", server_PORT=12345):
                                   f"transfer is already in progress")
         else:
             sock.send(Response.SUCCESS.value)
+            start_ns = now() if tracer is not None else 0
             clients_dict[sock]["file"] = open(file_name, "wb")
+            if tracer is not None:
+                tracer.record(TracePhase.SERVER_OPEN, start_ns, sock.fileno())
+            clients_dict[sock]["file_size"] = file_size
             file_names.append(file_name)
+            # Перезапись существующего файла не меняет mtime каталога, поэтому сбрасываем индекс явно
+            dir_index["dirty"] = True
             print(f"Receiving file {file_name} ({file_size} bytes) ...")
 
     def handle_data_message(sock, data):
-        IP, PORT = sock.getpeername()
+        IP, PORT = clients_dict[sock]["address"]
         if clients_dict[sock]["file"] is not None:
+            start_ns = now() if tracer is not None else 0
             sock.send(Response.SUCCESS.value)
+            if tracer is not None:
+                tracer.record(TracePhase.SERVER_ACK, start_ns, sock.fileno(), 1)
+                start_ns = now()
             clients_dict[sock]["file"].write(data)
+            if tracer is not None:
+                tracer.record(TracePhase.SERVER_WRITE, start_ns, sock.fileno(), len(data))
         else:
             sock.send(Response.ERROR.value)
             raise ConnectionError(f"Client {IP}:{PORT} disconnected with invalid message type: DATA")
 
+    def reject_fd(sock, reason):
+        """
+        Отклоняет переданный дескриптор: клиент переходит на передачу файла сообщениями DATA.
+        Args:
+            sock: socket, сокет клиента
+            reason: str, причина
+        """
+        IP, PORT = clients_dict[sock]["address"]
+        file = clients_dict[sock]["file"]
+        file.seek(0)
+        file.truncate()
+        sock.send(Response.FD_NOT_ACCEPTED.value)
+        print(f"File descriptor from {IP}:{PORT} not accepted ({reason}), falling back to streaming")
+
+    def handle_fd_message(sock, fds):
+        IP, PORT = clients_dict[sock]["address"]
+        file = clients_dict[sock]["file"]
+        try:
+            if file is None:
+                sock.send(Response.ERROR.value)
+                raise ConnectionError(f"Client {IP}:{PORT} disconnected with invalid message type: FD")
+            if not fds:
+                reject_fd(sock, "file descriptor was not passed")
+                return
+            if os.fstat(fds[0]).st_size != clients_dict[sock]["file_size"]:
+                reject_fd(sock, "file size does not match")
+                return
+
+            start_ns = now() if tracer is not None else 0
+            if clients_dict[sock]["file_size"] == 0 or clone_file_descriptor(fds[0], file.fileno()):
+                if tracer is not None:
+                    tracer.record(TracePhase.SERVER_CLONE, start_ns, sock.fileno(), clients_dict[sock]["file_size"])
+                sock.send(Response.SUCCESS.value)
+                return
+
+            # Без reflink копируем порциями из цикла epoll (см. write_client_socket), не блокируя других клиентов
+            clients_dict[sock]["copy_fd"] = fds.pop(0)
+            clients_dict[sock]["copy_offset"] = 0
+            epoll.modify(sock, select.EPOLLOUT)
+        finally:
+            for fd in fds:
+                os.close(fd)
+
+    def log_result(sock, result):
+        """
+        Записывает результат приема файла в лог-файл.
+        Args:
+            sock: socket, сокет клиента
+            result: Result, результат
+        """
+        start_ns = now() if tracer is not None else 0
+        update_log_file(clients_dict[sock]["file"].name, result.name)
+        if tracer is not None:
+            tracer.record(TracePhase.SERVER_LOG, start_ns, sock.fileno())
+
     def handle_end_message(sock):
-        IP, PORT = sock.getpeername()
+        IP, PORT = clients_dict[sock]["address"]
         sock.send(Response.SUCCESS.value)
-        update_log_file(clients_dict[sock]["file"].name, Result.SUCCESS.name)
+        log_result(sock, Result.SUCCESS)
         print(f"Connection from {IP}:{PORT} closed successfully")
 
     def handle_cancel_message(sock):
-        IP, PORT = sock.getpeername()
+        IP, PORT = clients_dict[sock]["address"]
         sock.send(Response.SUCCESS.value)
-        update_log_file(clients_dict[sock]["file"].name, Result.CANCEL.name)
+        log_result(sock, Result.CANCEL)
         print(f"Connection from {IP}:{PORT} canceled")
 
-    def handle_message(client_socket, message_type, data):
-        client_IP, client_PORT = client_socket.getpeername()
+    def get_dir_index():
+        """
+        Возвращает индекс каталога, перечитывая его только при необходимости.
+
+        Returns:
+            dir_index: dict, индекс каталога
+        """
+        mtime = os.stat(".").st_mtime_ns
+        if dir_index["dirty"] or dir_index["mtime"] != mtime:
+            dir_index["names"] = scan_directory(exclude=file_names)
+            dir_index["mtime"] = mtime
+            # Если mtime совсем свежий, в том же такте могут произойти еще изменения - перечитаем каталог снова
+            dir_index["dirty"] = time.time_ns() - mtime < MTIME_RACY_WINDOW_NS
+        return dir_index
+
+    def start_sending(sock, header, file=None, offset=0, length=0):
+        """
+        Ставит ответ в очередь на отправку и переключает сокет на ожидание EPOLLOUT.
+        Args:
+            sock: socket, сокет клиента
+            header: bytes, заголовок ответа (или весь ответ)
+            file: file, файл, отправляемый после заголовка через os.sendfile
+            offset: int, смещение в файле
+            length: int, количество байт файла
+        """
+        clients_dict[sock]["out_buffer"] = header
+        clients_dict[sock]["send_file"] = file
+        clients_dict[sock]["send_offset"] = offset
+        clients_dict[sock]["send_remaining"] = length
+        epoll.modify(sock, select.EPOLLOUT)
+
+    def handle_list_message(sock):
+        # В индексе только имена: размеры берутся при каждом запросе, т.к. дозапись в файл не меняет mtime каталога
+        lines = []
+        for name in sorted(get_dir_index()["names"]):
+            try:
+                lines.append(f"{name}\t{os.stat(name).st_size}\n")
+            except OSError:
+                dir_index["dirty"] = True
+        listing = "".join(lines).encode()
+        start_sending(sock, Response.SUCCESS.value + len(listing).to_bytes(8) + listing)
+
+    def handle_get_message(sock, data):
+        IP, PORT = clients_dict[sock]["address"]
+        if clients_dict[sock]["file"] is not None:
+            sock.send(Response.ERROR.value)
+            raise ConnectionError(f"Client {IP}:{PORT} disconnected with invalid message type: GET")
+
+        # Формат запроса: имя файла, смещение и длина диапазона (0 - до конца файла)
+        try:
+            fields = data.decode().split('\t')
+            file_name = fields[0]
+            offset = int(fields[1]) if len(fields) > 1 else 0
+            length = int(fields[2]) if len(fields) > 2 else 0
+        except ValueError:
+            sock.send(Response.ERROR.value)
+            raise ConnectionError(f"Client {IP}:{PORT} disconnected with malformed GET request")
+
+        # Отдаем только файлы из индекса, которые сейчас не принимаются:
+        # это исключает недокачанные файлы, лог и выход за пределы каталога
+        file = None
+        if file_name not in file_names and file_name in get_dir_index()["names"]:
+            try:
+                file = open(file_name, "rb")
+            except OSError:
+                dir_index["dirty"] = True
+        if file is None:
+            sock.send(Response.FILE_NOT_FOUND.value)
+            raise ConnectionError(f"Client {IP}:{PORT} disconnected because file {file_name} was not found")
+
+        file_size = os.fstat(file.fileno()).st_size
+        if length == 0:
+            length = file_size - offset
+        if offset < 0 or length < 0 or offset + length > file_size:
+            file.close()
+            sock.send(Response.ERROR.value)
+            raise ConnectionError(f"Client {IP}:{PORT} disconnected with invalid range {offset}+{length} "
+                                  f"of file {file_name}")
+
+        start_sending(sock, Response.SUCCESS.value + length.to_bytes(8), file, offset, length)
+        print(f"Sending file {file_name} ({offset}-{offset + length} of {file_size} bytes) ...")
+
+    def handle_message(client_socket, message_type, data, fds=()):
+        client_IP, client_PORT = clients_dict[client_socket]["address"]
         if message_type == MessageType.START.value:
             handle_start_message(client_socket, data)
         elif message_type == MessageType.DATA.value:
@@ -211,6 +510,12 @@ def main(directory="data", server_IP="127.0.0.1", server_PORT=12345):
             handle_cancel_message(client_socket)
             close_client_socket(client_socket, delete_file=True)
             return
+        elif message_type == MessageType.LIST.value:
+            handle_list_message(client_socket)
+        elif message_type == MessageType.GET.value:
+            handle_get_message(client_socket, data)
+        elif message_type == MessageType.FD.value:
+            handle_fd_message(client_socket, fds)
         else:
             client_socket.send(Response.ERROR.value)
             raise ConnectionError(f"Client {client_IP}:{client_PORT} disconnected with invalid message type: "
@@ -221,39 +526,121 @@ def main(directory="data", server_IP="127.0.0.1", server_PORT=12345):
 
     def hear_client_socket(sock):
         client_socket = sock
-        client_IP, client_PORT = client_socket.getpeername()
+        client_IP, client_PORT = clients_dict[client_socket]["address"]
         try:
             if clients_dict[client_socket]["data_len"] is not None:
                 # Принимаем данные (3-ий шаг)
-                message = client_socket.recv(clients_dict[client_socket]["data_len"])
+                fds = []
+                start_ns = now() if tracer is not None else 0
+                if (clients_dict[client_socket]["message_type"] == MessageType.FD.value
+                        and client_socket.family == socket.AF_UNIX):
+                    # Вместе с данными сообщения FD приходит дескриптор файла (SCM_RIGHTS)
+                    message, fds, _, _ = socket.recv_fds(client_socket, clients_dict[client_socket]["data_len"], 1)
+                else:
+                    message = client_socket.recv(clients_dict[client_socket]["data_len"])
+                if tracer is not None:
+                    tracer.record(TracePhase.SERVER_RECV, start_ns, client_socket.fileno(), len(message))
 
                 if clients_dict[client_socket]["data_len"] != len(message):
+                    for fd in fds:
+                        os.close(fd)
                     raise ConnectionError(f"Client {client_IP}:{client_PORT} disconnected while "
                                           f"receiving data")
 
                 # Обрабатываем данные
-                handle_message(client_socket, clients_dict[client_socket]["message_type"], message)
+                handle_message(client_socket, clients_dict[client_socket]["message_type"], message, fds)
 
             elif clients_dict[client_socket]["message_type"] is not None:
                 # Принимаем длину сообщения (2-ой шаг)
+                start_ns = now() if tracer is not None else 0
                 message = client_socket.recv(8)
-                if message is None:
+                if tracer is not None:
+                    tracer.record(TracePhase.SERVER_RECV, start_ns, client_socket.fileno(), len(message))
+                if not message:
                     raise ConnectionError(f"Client {client_IP}:{client_PORT}"
                                           f" disconnected while receiving message length")
                 clients_dict[client_socket]["data_len"] = int.from_bytes(message)
             else:
                 # Принимаем тип сообщения (1-ый шаг)
+                start_ns = now() if tracer is not None else 0
                 message = client_socket.recv(6)
-                if message is None:
+                if tracer is not None:
+                    tracer.record(TracePhase.SERVER_RECV, start_ns, client_socket.fileno(), len(message))
+                if not message and clients_dict[client_socket]["file"] is None:
+                    # Клиент закрыл соединение между запросами (LIST/GET)
+                    raise ConnectionError(f"Connection from {client_IP}:{client_PORT} closed")
+                if not message:
                     raise ConnectionError(f"Client {client_IP}:{client_PORT}"
                                           f" disconnected while receiving message type")
                 clients_dict[client_socket]["message_type"] = message
         except ConnectionError as e:
             if clients_dict[client_socket]["file"] is not None:
-                update_log_file(clients_dict[client_socket]["file"].name, Result.ERROR.name)
+                log_result(client_socket, Result.ERROR)
             close_client_socket(client_socket)
             print(e)
 
+    def write_client_socket(sock):
+        """
+        Продолжает отправку ответа клиенту, когда сокет готов к записи (EPOLLOUT).
+        Args:
+            sock: socket, сокет клиента
+        """
+        client_info = clients_dict[sock]
+        try:
+            if client_info["copy_fd"] is not None:
+                # Копируем файл по переданному дескриптору не более COPY_CHUNK_SIZE байт за итерацию
+                file = client_info["file"]
+                offset = client_info["copy_offset"]
+                try:
+                    start_ns = now() if tracer is not None else 0
+                    copied = copy_file_chunk(client_info["copy_fd"], file.fileno(), offset,
+                                             min(COPY_CHUNK_SIZE, client_info["file_size"] - offset))
+                    if tracer is not None:
+                        tracer.record(TracePhase.SERVER_COPY, start_ns, sock.fileno(), copied)
+                    if copied == 0:
+                        raise OSError(errno.EIO, "File was truncated while copying")
+                except OSError as e:
+                    os.close(client_info["copy_fd"])
+                    client_info["copy_fd"] = None
+                    reject_fd(sock, e)
+                    epoll.modify(sock, select.EPOLLIN)
+                    return
+                client_info["copy_offset"] = offset + copied
+                if client_info["copy_offset"] < client_info["file_size"]:
+                    return
+                os.close(client_info["copy_fd"])
+                client_info["copy_fd"] = None
+                client_info["out_buffer"] = Response.SUCCESS.value
+
+            try:
+                # Сначала досылаем заголовок, затем содержимое файла напрямую из ядра
+                while client_info["out_buffer"]:
+                    sent = sock.send(client_info["out_buffer"])
+                    client_info["out_buffer"] = client_info["out_buffer"][sent:]
+                while client_info["send_remaining"]:
+                    start_ns = now() if tracer is not None else 0
+                    sent = os.sendfile(sock.fileno(), client_info["send_file"].fileno(),
+                                       client_info["send_offset"], client_info["send_remaining"])
+                    if tracer is not None:
+                        tracer.record(TracePhase.SERVER_SENDFILE, start_ns, sock.fileno(), sent)
+                    if sent == 0:
+                        raise ConnectionError(f"File {client_info['send_file'].name} was truncated while sending")
+                    client_info["send_offset"] += sent
+                    client_info["send_remaining"] -= sent
+            except BlockingIOError:
+                # Буфер сокета заполнен, продолжим при следующем EPOLLOUT
+                return
+
+            if client_info["send_file"] is not None:
+                client_info["send_file"].close()
+                client_info["send_file"] = None
+            epoll.modify(sock, select.EPOLLIN)
+        except (ConnectionError, OSError) as e:
+            if client_info["file"] is not None:
+                log_result(sock, Result.ERROR)
+            close_client_socket(sock)
+            print(e)
+
     def exit_gracefully(signal_number, frame):
         """
         Завершает программу.
@@ -265,12 +652,25 @@ def main(directory="data", server_IP="127.0.0.1", server_PORT=12345):
         if not CLOSE_SERVER:
             CLOSE_SERVER = True
             print("\nClosing server socket...")
-            epoll.unregister(server_socket)
+            for listen_socket in listen_sockets:
+                epoll.unregister(listen_socket)
             clients = list(clients_dict.keys())
             for i in clients:
                 close_client_socket(i, delete_file=True)
             epoll.close()
-            server_socket.close()
+            for listen_socket in listen_sockets:
+                listen_socket.close()
+            if unix_socket_path is not None:
+                try:
+                    remove_unix_socket(unix_socket_path)
+                except OSError as e:
+                    print(f"Error: {e}")
+            if tracer is not None:
+                try:
+                    tracer.dump(trace_path)
+                    print(f"Trace saved to {trace_path}")
+                except OSError as e:
+                    print(f"Error: {e}")
             exit(0)
 
     # Регистрируем обработчик сигналов для принудительного завершения
@@ -284,10 +684,16 @@ def main(directory="data", server_IP="127.0.0.1", server_PORT=12345):
             for fd, event in events:
                 if event & select.EPOLLIN:
                     s = fd_to_socket[fd]
-                    if s is server_socket:
-                        create_client_socket()
+                    if s in listen_sockets:
+                        create_client_socket(s)
+                    elif tracer is None:
+                        hear_client_socket(s)
                     else:
+                        start_ns = now()
                         hear_client_socket(s)
+                        tracer.record(TracePhase.SERVER_STEP, start_ns, fd)
+                elif event & (select.EPOLLOUT | select.EPOLLERR | select.EPOLLHUP):
+                    write_client_socket(fd_to_socket[fd])
 
     finally:
         exit_gracefully(None, None)
@@ -296,10 +702,14 @@ def main(directory="data", server_IP="127.0.0.1", server_PORT=12345):
 if __name__ == "__main__":
     # Парсинг аргументов командной строки
     parser = argparse.ArgumentParser()
-    parser.add_argument("-directory", default="data", help="Directory to store received files (default: ./data)")
+    parser.add_argument("-directory", default="data", help="Directory to store received and served files (default: ./data)")
     parser.add_argument("-server_IP", default="127.0.0.1", help="Server IP")
     parser.add_argument("-server_PORT", default=12345, help="Server port")
+    parser.add_argument("-unix_socket", default=None,
+                        help="Also listen on this Unix domain socket for same-host clients (default: disabled)")
+    parser.add_argument("-trace", default=None,
+                        help="Record hot-path trace and save it to this file on exit (default: disabled)")
     args = parser.parse_args()
 
     # Запуск сервера
-    main(args.directory, args.server_IP, int(args.server_PORT))
+    main(args.directory, args.server_IP, int(args.server_PORT), args.unix_socket, args.trace)
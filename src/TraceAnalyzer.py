@@ -0,0 +1,198 @@
+import argparse
+from sys import exit
+
+from Enums import TracePhase
+from Tracing import load_trace
+
+# Вложенность фаз: фаза -> родительская фаза (для подсчета собственного времени и flame-сводки)
+PARENTS = {
+    TracePhase.SERVER_RECV: TracePhase.SERVER_STEP,
+    TracePhase.SERVER_WRITE: TracePhase.SERVER_STEP,
+    TracePhase.SERVER_ACK: TracePhase.SERVER_STEP,
+    TracePhase.SERVER_OPEN: TracePhase.SERVER_STEP,
+    TracePhase.SERVER_LOG: TracePhase.SERVER_STEP,
+    TracePhase.SERVER_CLONE: TracePhase.SERVER_STEP,
+    TracePhase.CLIENT_READ: TracePhase.CLIENT_CHUNK,
+    TracePhase.CLIENT_SEND: TracePhase.CLIENT_CHUNK,
+    TracePhase.CLIENT_ACK: TracePhase.CLIENT_CHUNK,
+}
+
+BAR_WIDTH = 40
+
+
+def percentile(sorted_values, fraction):
+    """
+    Возвращает перцентиль отсортированного списка.
+    Args:
+        sorted_values: list, отсортированные значения
+        fraction: float, доля (0..1)
+    """
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+def format_ns(value):
+    """
+    Форматирует длительность в наносекундах.
+    Args:
+        value: int, длительность (нс)
+    """
+    if value >= 1_000_000_000:
+        return f"{value / 1_000_000_000:.2f}s"
+    if value >= 1_000_000:
+        return f"{value / 1_000_000:.2f}ms"
+    if value >= 1_000:
+        return f"{value / 1_000:.1f}us"
+    return f"{value}ns"
+
+
+def stack_name(phase):
+    """
+    Возвращает стек фазы в формате "server;step;recv".
+    Args:
+        phase: TracePhase, фаза
+    """
+    side = phase.name.split("_", 1)[0].lower()
+    names = []
+    while phase is not None:
+        names.append(phase.name.split("_", 1)[1].lower())
+        phase = PARENTS.get(phase)
+    return ";".join([side] + names[::-1])
+
+
+def collect(paths):
+    """
+    Загружает файлы трассировки и группирует длительности по фазам.
+    Args:
+        paths: list, пути к файлам
+
+    Returns:
+        durations: dict, фаза -> список длительностей (нс)
+        sizes: dict, фаза -> суммарное количество байт
+    """
+    durations = {}
+    sizes = {}
+    for path in paths:
+        try:
+            records, dropped = load_trace(path)
+        except (OSError, ValueError) as e:
+            print(f"Error: {e}")
+            exit(1)
+        span = records[-1][0] + records[-1][1] - records[0][0] if records else 0
+        print(f"{path}: {len(records)} records, {dropped} dropped, span {format_ns(span)}")
+        for start_ns, duration, size, connection, phase in records:
+            phase = TracePhase(phase)
+            durations.setdefault(phase, []).append(duration)
+            sizes[phase] = sizes.get(phase, 0) + size
+    return durations, sizes
+
+
+def self_times(totals):
+    """
+    Считает собственное время фаз (за вычетом вложенных фаз).
+    Args:
+        totals: dict, фаза -> суммарная длительность (нс)
+    """
+    result = dict(totals)
+    for phase, total in totals.items():
+        parent = PARENTS.get(phase)
+        if parent in result:
+            result[parent] -= total
+    return {phase: max(0, value) for phase, value in result.items()}
+
+
+def print_breakdown(durations, sizes):
+    """
+    Выводит разбивку времени по фазам.
+    Args:
+        durations: dict, фаза -> список длительностей (нс)
+        sizes: dict, фаза -> суммарное количество байт
+    """
+    totals = {phase: sum(values) for phase, values in durations.items()}
+    own = self_times(totals)
+    all_own = sum(own.values()) or 1
+
+    print(f"\n{'phase':<16}{'count':>9}{'total':>11}{'self':>11}{'self%':>7}"
+          f"{'mean':>10}{'p50':>10}{'p99':>10}{'max':>10}{'MB/s':>9}")
+    for phase in sorted(durations, key=lambda p: p.value):
+        values = sorted(durations[phase])
+        throughput = sizes[phase] / totals[phase] * 1000 if totals[phase] else 0
+        print(f"{phase.name:<16}{len(values):>9}{format_ns(totals[phase]):>11}{format_ns(own[phase]):>11}"
+              f"{100 * own[phase] / all_own:>6.1f}%{format_ns(totals[phase] // len(values)):>10}"
+              f"{format_ns(percentile(values, 0.5)):>10}{format_ns(percentile(values, 0.99)):>10}"
+              f"{format_ns(values[-1]):>10}{throughput:>9.1f}")
+    if TracePhase.SERVER_STEP in own:
+        print("(SERVER_STEP is one receive step of a frame: message type, length or data; its self time is "
+              "header parsing, dispatch and untraced work such as print and socket close)")
+
+
+def print_histograms(durations):
+    """
+    Выводит гистограммы задержек по фазам (интервалы - степени двойки).
+    Args:
+        durations: dict, фаза -> список длительностей (нс)
+    """
+    for phase in sorted(durations, key=lambda p: p.value):
+        buckets = {}
+        for value in durations[phase]:
+            bucket = value.bit_length()
+            buckets[bucket] = buckets.get(bucket, 0) + 1
+        peak = max(buckets.values())
+        print(f"\n{phase.name} latency:")
+        for bucket in range(min(buckets), max(buckets) + 1):
+            count = buckets.get(bucket, 0)
+            low = 1 << (bucket - 1) if bucket else 0
+            bar = "#" * (count * BAR_WIDTH // peak) if count else ""
+            print(f"  {'>= ' + format_ns(low):>12} |{bar:<{BAR_WIDTH}}| {count}")
+
+
+def print_flame(durations, collapsed_path=None):
+    """
+    Выводит flame-сводку (собственное время по стекам фаз) и при необходимости
+    сохраняет ее в формате свернутых стеков для flamegraph.pl.
+    Args:
+        durations: dict, фаза -> список длительностей (нс)
+        collapsed_path: str, путь к файлу свернутых стеков (None - не сохранять)
+    """
+    own = self_times({phase: sum(values) for phase, values in durations.items()})
+    stacks = sorted(((stack_name(phase), value) for phase, value in own.items()), key=lambda item: -item[1])
+    peak = max((value for _, value in stacks), default=0) or 1
+
+    print("\nFlame summary (self time):")
+    for name, value in stacks:
+        print(f"  {'#' * (value * BAR_WIDTH // peak):<{BAR_WIDTH}} {format_ns(value):>10}  {name}")
+
+    if collapsed_path is not None:
+        try:
+            with open(collapsed_path, "w") as collapsed_file:
+                for name, value in stacks:
+                    collapsed_file.write(f"{name} {value}\n")
+        except OSError as e:
+            print(f"Error: {e}")
+            exit(1)
+        print(f"Collapsed stacks saved to {collapsed_path}")
+
+
+def main(paths, collapsed_path=None):
+    """
+    Основная функция
+    Args:
+        paths: list, пути к файлам трассировки
+        collapsed_path: str, путь к файлу свернутых стеков (None - не сохранять)
+    """
+    durations, sizes = collect(paths)
+    if not durations:
+        print("No trace records")
+        exit(1)
+    print_breakdown(durations, sizes)
+    print_histograms(durations)
+    print_flame(durations, collapsed_path)
+
+
+if __name__ == "__main__":
+    # Парсинг аргументов командной строки
+    parser = argparse.ArgumentParser(description="Analyze traces recorded with Server.py -trace / Client.py --trace")
+    parser.add_argument("traces", nargs="+", help="Trace files")
+    parser.add_argument("--collapsed", default=None, help="Save collapsed stacks for flamegraph.pl to this file")
+    args = parser.parse_args()
+
+    main(args.traces, args.collapsed)
@@ -0,0 +1,83 @@
+import struct
+import time
+
+# Запись трассировки: время начала (нс), длительность (нс), размер (байт), соединение, фаза
+RECORD = struct.Struct("<QIIHBx")
+# Заголовок файла трассировки: сигнатура, версия, размер записи, емкость буфера, всего записей
+HEADER = struct.Struct("<8sHHIQ")
+MAGIC = b"CSFTRACE"
+VERSION = 1
+
+now = time.perf_counter_ns
+
+
+class Tracer:
+    """
+    Кольцевой буфер событий трассировки горячего пути.
+    Записи хранятся в компактном бинарном виде; при переполнении самые старые записи перезаписываются.
+    """
+
+    def __init__(self, capacity=1 << 16):
+        """
+        Args:
+            capacity: int, максимальное количество хранимых записей
+        """
+        self.capacity = capacity
+        self.buffer = bytearray(RECORD.size * capacity)
+        self.count = 0  # Всего записей (включая перезаписанные)
+
+    def record(self, phase, start_ns, connection=0, size=0):
+        """
+        Записывает событие, закончившееся в момент вызова.
+        Args:
+            phase: TracePhase, фаза
+            start_ns: int, время начала (значение now())
+            connection: int, идентификатор соединения
+            size: int, количество обработанных байт
+        """
+        duration = now() - start_ns
+        RECORD.pack_into(self.buffer, (self.count % self.capacity) * RECORD.size,
+                         start_ns, min(duration, 0xFFFFFFFF), min(size, 0xFFFFFFFF), connection & 0xFFFF,
+                         phase.value)
+        self.count += 1
+
+    def dump(self, path):
+        """
+        Сохраняет записи в файл (от старых к новым).
+        Args:
+            path: str, путь к файлу
+
+        raise:
+            OSError
+        """
+        stored = min(self.count, self.capacity)
+        split = (self.count % self.capacity) * RECORD.size if self.count > self.capacity else 0
+        with open(path, "wb") as trace_file:
+            trace_file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, self.capacity, self.count))
+            trace_file.write(self.buffer[split:stored * RECORD.size])
+            trace_file.write(self.buffer[:split])
+
+
+def load_trace(path):
+    """
+    Загружает файл трассировки.
+    Args:
+        path: str, путь к файлу
+
+    Returns:
+        records: list, список кортежей (начало, длительность, размер, соединение, фаза)
+        dropped: int, количество перезаписанных (потерянных) записей
+
+    raise:
+        OSError, ValueError
+    """
+    with open(path, "rb") as trace_file:
+        data = trace_file.read()
+    if len(data) < HEADER.size:
+        raise ValueError(f"{path} is not a trace file")
+    magic, version, record_size, capacity, count = HEADER.unpack_from(data)
+    if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+        raise ValueError(f"{path} is not a trace file or has unsupported version")
+    body = data[HEADER.size:]
+    records = list(RECORD.iter_unpack(body[:len(body) - len(body) % RECORD.size]))
+    return records, count - len(records)